@@ -0,0 +1,185 @@
+import os
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# TXT（展開後サイズ）をpandasで読み込んでCSVに書き出すときのメモリ使用量の目安（倍率）
+PARSE_MEMORY_FACTOR = 5
+# --memory-limit を指定しなかった場合に使う、利用可能メモリの割合
+DEFAULT_MEMORY_FRACTION = 0.6
+
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_memory_size(text):
+    """
+    "512M", "2G", "1.5GiB", "1048576" のようなメモリサイズ表記をバイト数に変換する。
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?\s*", str(text).upper())
+    if not match:
+        raise ValueError(f"メモリサイズを解釈できません: {text}")
+    number, unit = match.groups()
+    return int(float(number) * _SIZE_UNITS[unit])
+
+
+def _read_int(path):
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    return int(value) if value.isdigit() else None
+
+
+def available_memory():
+    """
+    現在利用可能なメモリ量（バイト）を返す。
+    コンテナ内ではcgroupの上限も考慮し、小さい方を返す。取得できない場合はNone。
+    """
+    candidates = []
+
+    # ホスト全体の利用可能メモリ
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    candidates.append(int(line.split()[1]) * 1024)
+                    break
+    except OSError:
+        try:
+            candidates.append(os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE"))
+        except (ValueError, OSError, AttributeError):
+            pass
+
+    # cgroup v2 / v1 のメモリ上限（上限なしの場合は "max" や巨大な値になる）
+    for limit_path, usage_path in [
+        ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current"),
+        ("/sys/fs/cgroup/memory/memory.limit_in_bytes", "/sys/fs/cgroup/memory/memory.usage_in_bytes"),
+    ]:
+        limit = _read_int(limit_path)
+        usage = _read_int(usage_path)
+        if limit is not None and usage is not None and limit < 1 << 60:
+            candidates.append(max(0, limit - usage))
+            break
+
+    return min(candidates) if candidates else None
+
+
+def default_memory_budget():
+    """
+    利用可能メモリの一定割合をメモリ予算とする。取得できない場合はNone（制限なし）。
+    cgroupの上限に達して0になった場合も制限は外さず、タスクを1つずつ実行する予算にする。
+    """
+    memory = available_memory()
+    return max(1, int(memory * DEFAULT_MEMORY_FRACTION)) if memory is not None else None
+
+
+def estimate_zip_memory(zip_file_path):
+    """ZIP内のTXTの展開後サイズから、CSV変換時に必要なメモリ量を見積もる"""
+    try:
+        with zipfile.ZipFile(zip_file_path, "r") as zip_ref:
+            uncompressed = sum(info.file_size for info in zip_ref.infolist() if info.filename.endswith(".txt"))
+    except (OSError, zipfile.BadZipFile):
+        # 壊れたZIPは処理側で例外になるので、見積もりはファイルサイズで代用
+        return os.path.getsize(zip_file_path)
+    return uncompressed * PARSE_MEMORY_FACTOR
+
+
+class AdaptiveScheduler:
+    """
+    メモリ予算とスループットに応じて並列数を調整しながらタスクを実行するスケジューラ。
+
+    - タスクは見積もりメモリの大きい順に投入する（大きいファイルを先に片付けて末尾の待ち時間を減らす）
+    - 実行中タスクの見積もりメモリの合計が memory_limit を超えないように投入を止める
+      （見積もりが予算を超えるタスクも、単独でなら実行する）
+    - 一定件数の完了ごとにスループットを測り、改善していれば並列数を増やし、悪化していれば減らす
+
+    インスタンスを使い回すと、調整後の並列数が次の run() に引き継がれる。
+    """
+
+    def __init__(self, max_workers=None, min_workers=1, initial_workers=None, memory_limit=None, tolerance=0.05):
+        cpu_count = os.cpu_count() or 1
+        self.max_workers = max(1, max_workers or cpu_count)
+        self.min_workers = max(1, min(min_workers, self.max_workers))
+        initial = initial_workers or max(1, cpu_count // 2)
+        self.workers = min(max(initial, self.min_workers), self.max_workers)
+        self.memory_limit = memory_limit
+        self.tolerance = tolerance
+        self._direction = 1
+        self._last_rate = None
+        self._lock = threading.Lock()
+
+    def describe(self):
+        memory = f"{self.memory_limit / 1024**2:.0f}MB" if self.memory_limit is not None else "制限なし"
+        return f"並列数 {self.workers}（{self.min_workers}〜{self.max_workers}）, メモリ予算 {memory}"
+
+    def _adjust(self, rate):
+        """直前の計測区間とスループットを比べて並列数を1つずつ上下させる（山登り法）"""
+        with self._lock:
+            if self._last_rate is not None:
+                if rate < self._last_rate * (1 - self.tolerance):
+                    self._direction = -self._direction
+                elif rate <= self._last_rate * (1 + self.tolerance):
+                    # 変化が誤差の範囲なら、現在の並列数を維持
+                    self._last_rate = rate
+                    return
+            self._last_rate = rate
+            self.workers = min(max(self.workers + self._direction, self.min_workers), self.max_workers)
+
+    def run(self, func, tasks):
+        """
+        tasks は (key, args, cost) のリスト。cost は見積もりメモリ（バイト）で、不明なら0。
+        完了した順に (key, future) を返すジェネレータ。
+        """
+        # 末尾から取り出すので、昇順に並べて最大のタスクを末尾に置く
+        pending = sorted(tasks, key=lambda task: task[2])
+        running = {}
+        memory_in_use = 0
+
+        window_start = time.perf_counter()
+        window_done = 0
+        window_cost = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # 並列数とメモリ予算の範囲でタスクを投入
+                while pending and len(running) < self.workers:
+                    key, args, cost = pending[-1]
+                    over_budget = self.memory_limit is not None and memory_in_use + cost > self.memory_limit
+                    if running and over_budget:
+                        # 大きいタスクが入らない場合は、予算に収まる小さいタスクを探す
+                        fitting = next(
+                            (
+                                index
+                                for index in range(len(pending) - 1, -1, -1)
+                                if memory_in_use + pending[index][2] <= self.memory_limit
+                            ),
+                            None,
+                        )
+                        if fitting is None:
+                            break
+                        key, args, cost = pending.pop(fitting)
+                    else:
+                        pending.pop()
+                    running[executor.submit(func, *args)] = (key, cost)
+                    memory_in_use += cost
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, cost = running.pop(future)
+                    memory_in_use -= cost
+                    window_done += 1
+                    window_cost += cost
+                    yield key, future
+
+                # 並列数と同じ件数が完了するごとにスループットを計測
+                if window_done >= self.workers:
+                    elapsed = time.perf_counter() - window_start
+                    if elapsed > 0:
+                        # 見積もりメモリが分かる場合は処理量（バイト/秒）、分からない場合は件数/秒
+                        self._adjust((window_cost or window_done) / elapsed)
+                    window_start = time.perf_counter()
+                    window_done = 0
+                    window_cost = 0
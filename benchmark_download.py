@@ -0,0 +1,229 @@
+"""
+ダウンロード処理のスループット計測。
+
+スタンドインサーバー（estat_mock_server.py）を起動し、ダウンロード方式ごとに
+統計表1つ分（全ページ）を取得して files/秒 と 秒/ページ を表示する。
+
+    python benchmark_download.py --engines sequential,threaded,adaptive --latency 0.1 --bandwidth 1000000
+    python benchmark_download.py --url http://127.0.0.1:8000 --engines selenium
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from adaptive_scheduler import AdaptiveScheduler
+from estat_listing import download_file, fetch_html, find_result_list_url, page_url, parse_result_list
+from estat_mock_server import SURVEYS, build_parser, start_server
+
+try:
+    from selenium.common.exceptions import WebDriverException
+except ImportError:
+    # Seleniumが無い環境では、selenium方式はImportErrorで計測対象外になる
+    WebDriverException = ImportError
+
+
+def download_url(url, dest_dir, max_retries=3, retry_wait=1.0):
+    """URLのZIPファイルを dest_dir に保存し、保存したバイト数を返す"""
+    return os.path.getsize(download_file(url, dest_dir, max_retries, retry_wait))
+
+
+def run_sequential(page_links, dest_dir, options):
+    """1ファイルずつ順番にダウンロード"""
+    results = []
+    for url in page_links:
+        try:
+            results.append(download_url(url, dest_dir, options.retries, options.retry_wait))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def run_threaded(page_links, dest_dir, options):
+    """クローラーと同じくスレッドプールで並列ダウンロード"""
+    results = []
+    with ThreadPoolExecutor(max_workers=options.workers) as executor:
+        futures = [
+            executor.submit(download_url, url, dest_dir, options.retries, options.retry_wait) for url in page_links
+        ]
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+    return results
+
+
+def run_adaptive(page_links, dest_dir, options):
+    """スループットに応じて並列数を調整しながらダウンロード（estat_sync.py の取得と同じ）"""
+    results = []
+    tasks = [(url, (url, dest_dir, options.retries, options.retry_wait), 0) for url in page_links]
+    for url, future in options.download_scheduler.run(download_url, tasks):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+ENGINES = {
+    "sequential": run_sequential,
+    "threaded": run_threaded,
+    "adaptive": run_adaptive,
+}
+
+
+def crawl_with_urllib(engine, result_url, dest_dir, options):
+    """結果一覧の全ページを巡回し、ページごとの所要時間とダウンロード結果を返す"""
+    page_times = []
+    results = []
+    total_pages = 1
+    page_number = 1
+    while page_number <= total_pages:
+        page_start = time.perf_counter()
+        current_url = page_url(result_url, page_number)
+        page_links, total_pages = parse_result_list(fetch_html(current_url), current_url)
+        results.extend(ENGINES[engine](page_links, dest_dir, options))
+        page_times.append(time.perf_counter() - page_start)
+        page_number += 1
+    return page_times, results
+
+
+def crawl_with_selenium(result_url, dest_dir, options):
+    """Chrome（headless）でCSVアイコンをクリックしてダウンロードする。クローラーと同じXPathを使う"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless=new")
+    chrome_options.add_experimental_option(
+        "prefs",
+        {
+            "download.default_directory": dest_dir,
+            "download.prompt_for_download": False,
+            "profile.default_content_setting_values.automatic_downloads": 1,
+        },
+    )
+    driver = webdriver.Chrome(options=chrome_options)
+    page_times = []
+    results = []
+    try:
+        driver.get(result_url)
+        last_page = driver.find_element(By.XPATH, "//span[@class='stat-paginate-last js-gisdownload-tabindex']")
+        total_pages = int(last_page.get_attribute("data-page"))
+        for page_number in range(1, total_pages + 1):
+            page_start = time.perf_counter()
+            if page_number > 1:
+                # 前のページの一覧が消えるまで待ってから、新しいページのリンクを集める
+                old_list = driver.find_element(By.CLASS_NAME, "stat-resorce_list-body")
+                driver.find_element(By.XPATH, f"//span[@data-page='{page_number}']").click()
+                WebDriverWait(driver, 15).until(EC.staleness_of(old_list))
+            WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.CLASS_NAME, "stat-resorce_list-body")))
+            csv_links = driver.find_elements(
+                By.XPATH,
+                "//div[@class='stat-resorce_list-body']//a[contains(@class, 'stat-dl_icon') and span[contains(text(), 'CSV')]]",
+            )
+            before = {f for f in os.listdir(dest_dir) if f.endswith(".zip")}
+            for csv_link in csv_links:
+                csv_link.click()
+
+            # 全ファイルのダウンロード完了（.crdownloadが消える）まで待機
+            deadline = time.time() + 120
+            while time.time() < deadline:
+                files = os.listdir(dest_dir)
+                new_files = {f for f in files if f.endswith(".zip")} - before
+                if len(new_files) >= len(csv_links) and not any(f.endswith(".crdownload") for f in files):
+                    break
+                time.sleep(0.1)
+            new_files = {f for f in os.listdir(dest_dir) if f.endswith(".zip")} - before
+            results.extend(os.path.getsize(os.path.join(dest_dir, f)) for f in new_files)
+            results.extend([TimeoutError()] * (len(csv_links) - len(new_files)))
+            page_times.append(time.perf_counter() - page_start)
+    finally:
+        driver.quit()
+    return page_times, results
+
+
+def benchmark_engine(engine, result_url, options):
+    """1つのダウンロード方式を計測して結果の辞書を返す"""
+    dest_dir = tempfile.mkdtemp(prefix=f"bench_{engine}_")
+    # adaptiveはページをまたいで同じスケジューラを使う（estat_sync.py の取得と同じ設定）
+    options.download_scheduler = AdaptiveScheduler(max_workers=2 * (os.cpu_count() or 1), initial_workers=options.workers)
+    try:
+        start = time.perf_counter()
+        if engine == "selenium":
+            page_times, results = crawl_with_selenium(result_url, dest_dir, options)
+        else:
+            page_times, results = crawl_with_urllib(engine, result_url, dest_dir, options)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(dest_dir, ignore_errors=True)
+
+    files = sum(1 for result in results if not isinstance(result, Exception))
+    return {
+        "engine": engine,
+        "files": files,
+        "errors": len(results) - files,
+        "pages": len(page_times),
+        "elapsed": elapsed,
+        "files_per_sec": files / elapsed if elapsed else 0.0,
+        "sec_per_page": sum(page_times) / len(page_times) if page_times else 0.0,
+        "mb_per_sec": sum(r for r in results if not isinstance(r, Exception)) / elapsed / 1e6 if elapsed else 0.0,
+    }
+
+
+def print_report(rows):
+    print(f"{'engine':<12}{'files':>7}{'errors':>8}{'pages':>7}{'elapsed[s]':>12}{'files/s':>10}{'s/page':>9}{'MB/s':>8}")
+    for row in rows:
+        print(
+            f"{row['engine']:<12}{row['files']:>7}{row['errors']:>8}{row['pages']:>7}"
+            f"{row['elapsed']:>12.2f}{row['files_per_sec']:>10.2f}{row['sec_per_page']:>9.2f}{row['mb_per_sec']:>8.2f}"
+        )
+
+
+def build_benchmark_parser():
+    # サーバー側の設定（遅延・帯域・エラー率など）はスタンドインサーバーと共通
+    parser = build_parser()
+    parser.description = "ダウンロード方式ごとのスループット計測"
+    parser.set_defaults(port=0)
+    parser.add_argument("--url", help="起動済みのサーバーを使う場合のベースURL（省略時は内部で起動）")
+    parser.add_argument("--engines", default="sequential,threaded,adaptive", help="計測する方式（sequential,threaded,adaptive,selenium）")
+    parser.add_argument("--toukei-code", default="00200521", choices=sorted(SURVEYS))
+    parser.add_argument("--year", default="2020")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2), help="threadedのスレッド数")
+    parser.add_argument("--retries", type=int, default=3, help="1ファイルあたりの最大試行回数")
+    parser.add_argument("--retry-wait", type=float, default=1.0, help="再試行までの待ち時間（秒, 試行ごとに増加）")
+    return parser
+
+
+if __name__ == "__main__":
+    options = build_benchmark_parser().parse_args()
+
+    server = None
+    base_url = options.url
+    if not base_url:
+        server, base_url = start_server(options)
+        print(f"スタンドインサーバーを起動しました: {base_url}")
+
+    try:
+        result_url = find_result_list_url(base_url, options.toukei_code, options.year)
+        rows = []
+        for engine in [e.strip() for e in options.engines.split(",") if e.strip()]:
+            if engine != "selenium" and engine not in ENGINES:
+                print(f"不明な方式です: {engine}")
+                continue
+            print(f"計測中: {engine}")
+            try:
+                rows.append(benchmark_engine(engine, result_url, options))
+            except (ImportError, WebDriverException) as e:
+                # SeleniumやChrome/chromedriverが無い場合も、他の方式の結果は表示する
+                print(f"{engine} は利用できません: {e}")
+        print_report(rows)
+    finally:
+        if server:
+            server.shutdown()
@@ -1,7 +1,6 @@
 import os
 import shutil
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -11,6 +10,9 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 from webdriver_manager.chrome import ChromeDriverManager
 
+from adaptive_scheduler import AdaptiveScheduler
+from estat_listing import download_file
+
 # -------------- DLする前に一時保存するDIR作成 -------------------
 # 一時ダウンロードフォルダのパス
 tmp_dir = os.path.join(os.getcwd(), "tmp")
@@ -21,6 +23,9 @@ if os.path.exists(tmp_dir):
 # 新しいディレクトリを作成
 os.makedirs(tmp_dir)
 
+# CSVのダウンロードの並列数は、ページをまたいでスループットから調整する（estat_sync.py の取得と同じ設定）
+download_scheduler = AdaptiveScheduler(max_workers=2 * (os.cpu_count() or 1))
+
 
 # Chromeオプションを設定して一時ダウンロード先を指定
 def setup_chrome_options(tmp_dir):
@@ -116,27 +121,29 @@ def download_files_from_page(tmp_dir):
         if csv_links:
             downloaded_files = []  # To track the downloaded files
 
-            # Get half the number of CPU cores
-            cpu_count = os.cpu_count() or 1  # Fallback to 1 if CPU count can't be determined
-            max_workers = max(1, cpu_count // 2)  # Ensure at least 1 worker
-
-            print(f"Using {max_workers} threads for downloading.")
-
-            # Create a thread pool for downloading files in parallel
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                future_to_link = {
-                    executor.submit(download_csv_file, csv_link, tmp_dir, index): index
-                    for index, csv_link in enumerate(csv_links, start=1)
-                }
-
-                # Wait for the download to complete for all threads
-                for future in as_completed(future_to_link):
-                    index = future_to_link[future]
-                    try:
-                        future.result()
-                        downloaded_files.append(index)  # Track successful downloads
-                    except Exception as e:
-                        print(f"Error in downloading file {index}: {e}")
+            # Read the download URLs through the driver, then fetch them over HTTP in worker threads.
+            # Each task finishes when its own file is written, so the scheduler can tune the
+            # concurrency from the observed throughput (carried over from page to page).
+            tasks = []
+            click_links = []  # Links without a plain URL are clicked one at a time (the driver is not thread-safe)
+            for index, csv_link in enumerate(csv_links, start=1):
+                href = csv_link.get_attribute("href")
+                if href and href.startswith(("http://", "https://")):
+                    tasks.append((index, (href, tmp_dir), 0))
+                else:
+                    click_links.append((index, csv_link))
+
+            print(f"Downloading {len(tasks)} files: {download_scheduler.describe()}")
+            for index, future in download_scheduler.run(download_file, tasks):
+                try:
+                    future.result()
+                    downloaded_files.append(index)  # Track successful downloads
+                except Exception as e:
+                    print(f"Error in downloading file {index}: {e}")
+
+            for index, csv_link in click_links:
+                download_csv_file(csv_link, tmp_dir, index)
+                downloaded_files.append(index)
 
             return downloaded_files
         else:
@@ -217,7 +224,9 @@ def get_total_pages():
 
 try:
     # サイトのURL
-    url = "https://www.e-stat.go.jp/gis/statmap-search?page=1&type=1&toukeiCode=00200553"
+    # 環境変数 ESTAT_BASE_URL でローカルのスタンドインサーバー（estat_mock_server.py）に向けられる
+    base_url = os.environ.get("ESTAT_BASE_URL", "https://www.e-stat.go.jp").rstrip("/")
+    url = f"{base_url}/gis/statmap-search?page=1&type=1&toukeiCode=00200553"
 
     # Chromeドライバーのセットアップ
     chrome_options = setup_chrome_options(tmp_dir)
@@ -0,0 +1,228 @@
+import os
+import re
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from email.message import Message
+from html.parser import HTMLParser
+
+# e-Statのベースurl（ローカルのスタンドインサーバーを使う場合は環境変数で上書き）
+DEFAULT_BASE_URL = "https://www.e-stat.go.jp"
+
+
+def statmap_search_url(base_url, toukei_code, page=1):
+    """統計地図検索（statmap-search）のトップページURLを組み立てる"""
+    query = urllib.parse.urlencode({"page": page, "type": 1, "toukeiCode": toukei_code})
+    return f"{base_url.rstrip('/')}/gis/statmap-search?{query}"
+
+
+def page_url(url, page_number):
+    """URLのpageパラメータを指定ページに置き換える"""
+    parts = urllib.parse.urlsplit(url)
+    query = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+    query = [(key, value) for key, value in query if key != "page"]
+    query.insert(0, ("page", str(page_number)))
+    return urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(query)))
+
+
+def fetch_html(url, timeout=30):
+    """ページのHTMLを取得"""
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        charset = response.headers.get_content_charset() or "utf-8"
+        return response.read().decode(charset, errors="replace")
+
+
+def _classes(attrs):
+    return (dict(attrs).get("class") or "").split()
+
+
+class _AnchorParser(HTMLParser):
+    """ページ内の<a>タグ（テキストとhref）をすべて集める"""
+
+    def __init__(self):
+        super().__init__()
+        self.anchors = []
+        self._current = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            self._current = {"href": dict(attrs).get("href") or "", "class": _classes(attrs), "text": ""}
+
+    def handle_data(self, data):
+        if self._current is not None:
+            self._current["text"] += data
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._current is not None:
+            self._current["text"] = self._current["text"].strip()
+            self.anchors.append(self._current)
+            self._current = None
+
+
+class _ResultListParser(HTMLParser):
+    """
+    結果一覧ページから、stat-resorce_list-body内のCSVリンクと
+    stat-paginate-lastの総ページ数を取り出す。
+    クローラーのXPathと同じ条件で要素を拾う。
+    各CSVリンクには、直前のCSVリンクからそのリンクまでのテキスト（同じ項目のタイトル・公開日・サイズ）を付けて返す。
+    項目の区切りはstat-resorce_list-itemのクラスに頼らず、CSVリンクごとに区切る。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.entries = []
+        self.total_pages = None
+        self._list_depth = 0  # stat-resorce_list-body内のdivの深さ
+        self._anchor = None
+        self._item_texts = []
+
+    def handle_starttag(self, tag, attrs):
+        attr_map = dict(attrs)
+        if self._list_depth and any("stat-resorce_list-item" in name for name in _classes(attrs)):
+            self._item_texts = []
+        if tag == "div":
+            if self._list_depth:
+                self._list_depth += 1
+            elif attr_map.get("class") == "stat-resorce_list-body":
+                self._list_depth = 1
+        elif tag == "a" and self._list_depth and "stat-dl_icon" in _classes(attrs):
+            self._anchor = {"href": attr_map.get("href") or "", "text": ""}
+        elif tag == "span" and attr_map.get("class") == "stat-paginate-last js-gisdownload-tabindex":
+            try:
+                self.total_pages = int(attr_map.get("data-page"))
+            except (TypeError, ValueError):
+                pass
+
+    def handle_data(self, data):
+        if self._anchor is not None:
+            self._anchor["text"] += data
+        elif self._list_depth and data.strip():
+            self._item_texts.append(data.strip())
+
+    def handle_endtag(self, tag):
+        if tag == "div" and self._list_depth:
+            self._list_depth -= 1
+        elif tag == "a" and self._anchor is not None:
+            if "CSV" in self._anchor["text"]:
+                self.entries.append({"href": self._anchor["href"], "texts": list(self._item_texts)})
+                # 次の項目に前の項目の公開日・タイトルが混ざらないようにする
+                self._item_texts = []
+            self._anchor = None
+
+
+_DATE_PATTERN = re.compile(r"(\d{4})\s*[-/.年]\s*(\d{1,2})\s*[-/.月]\s*(\d{1,2})")
+_SIZE_PATTERN = re.compile(r"([\d,]+(?:\.\d+)?)\s*(KB|MB|GB|B|バイト)", re.IGNORECASE)
+_SIZE_UNITS = {"B": 1, "バイト": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3}
+
+
+def _parse_entry(entry, base_url):
+    """項目のテキストから、タイトル・公開日（YYYY-MM-DD）・サイズ（バイト）を取り出す。無ければNone"""
+    published = None
+    size = None
+    for text in entry["texts"]:
+        if published is None:
+            match = _DATE_PATTERN.search(text)
+            if match:
+                year, month, day = (int(value) for value in match.groups())
+                published = f"{year:04d}-{month:02d}-{day:02d}"
+        if size is None:
+            match = _SIZE_PATTERN.search(text)
+            if match:
+                number, unit = match.groups()
+                size = int(float(number.replace(",", "")) * _SIZE_UNITS[unit.upper()])
+    return {
+        "url": urllib.parse.urljoin(base_url, entry["href"]),
+        "title": entry["texts"][0] if entry["texts"] else "",
+        "published": published,
+        "size": size,
+    }
+
+
+def find_anchors(html, base_url):
+    """ページ内のリンクを {"text", "href", "class"} のリストで返す（hrefは絶対URL）"""
+    parser = _AnchorParser()
+    parser.feed(html)
+    for anchor in parser.anchors:
+        anchor["href"] = urllib.parse.urljoin(base_url, anchor["href"])
+    return parser.anchors
+
+
+def find_result_list_url(base_url, toukei_code, year, title=None):
+    """
+    トップページから指定年の500mメッシュ（aggregateUnit=H）の統計表（結果一覧）へのリンクを探す。
+    title を指定した場合は、リンクテキストにその文字列を含むものに限る。
+    """
+    top_url = statmap_search_url(base_url, toukei_code)
+    for anchor in find_anchors(fetch_html(top_url), top_url):
+        href = anchor["href"]
+        # 同じ年・同じタイトルでもメッシュの大きさごとに統計表があるので、集計単位は必ず確認する
+        if "aggregateUnit=H" not in href:
+            continue
+        if title is None:
+            if f"toukeiYear={year}" in href:
+                return href
+        elif title in anchor["text"] and ("toukeiYear=" not in href or f"toukeiYear={year}" in href):
+            # 国勢調査のようにリンクテキストで決まる統計表は、hrefに年が無くてもよい
+            return href
+    raise LookupError(f"{year}年の統計表へのリンクが見つかりませんでした: {top_url}")
+
+
+def parse_result_entries(html, base_url):
+    """
+    結果一覧ページを解析し、CSVごとの {"url", "title", "published", "size"} のリストと総ページ数を返す。
+    公開日とサイズはページに表示されている場合のみ値が入る。
+    """
+    parser = _ResultListParser()
+    parser.feed(html)
+    entries = [_parse_entry(entry, base_url) for entry in parser.entries]
+    return entries, parser.total_pages or 1
+
+
+def parse_result_list(html, base_url):
+    """
+    結果一覧ページを解析し、CSVダウンロードURLのリストと総ページ数を返す。
+    ページネーションが無い場合の総ページ数は1とする。
+    """
+    entries, total_pages = parse_result_entries(html, base_url)
+    return [entry["url"] for entry in entries], total_pages
+
+
+def list_result_entries(result_url):
+    """結果一覧の全ページを巡回して、すべてのCSVの項目を返す"""
+    entries = []
+    total_pages = 1
+    page_number = 1
+    while page_number <= total_pages:
+        current_url = page_url(result_url, page_number)
+        page_entries, total_pages = parse_result_entries(fetch_html(current_url), current_url)
+        entries.extend(page_entries)
+        page_number += 1
+    return entries
+
+
+def download_file(url, dest_dir, max_retries=3, retry_wait=5.0):
+    """
+    URLのファイルを dest_dir に保存し、保存先のパスを返す。
+    ファイル名はContent-Dispositionから取り、無ければURLの末尾を使う。
+    失敗時は retry_wait 秒 × 試行回数 だけ待って再試行する。
+    """
+    for attempt in range(1, max_retries + 1):
+        try:
+            with urllib.request.urlopen(url, timeout=120) as response:
+                header = Message()
+                header["Content-Disposition"] = response.headers.get("Content-Disposition", "")
+                file_name = header.get_filename() or urllib.parse.urlsplit(url).path
+                # サーバーが返したファイル名に "../" などが含まれていても dest_dir の外には書かない
+                file_name = os.path.basename(file_name.replace("\\", "/"))
+                if file_name in ("", ".", ".."):
+                    raise ValueError(f"保存するファイル名を決められません: {url}")
+                payload = response.read()
+            file_path = os.path.join(dest_dir, file_name)
+            with open(file_path, "wb") as f:
+                f.write(payload)
+            return file_path
+        except (urllib.error.URLError, OSError):
+            if attempt == max_retries:
+                raise
+            time.sleep(retry_wait * attempt)
@@ -0,0 +1,281 @@
+"""
+e-Stat（statmap-search）のローカル用スタンドインサーバー。
+
+クローラーが依存しているページ構造（年のspan、data-value2のメッシュ展開アイコン、
+stat-resorce_list-bodyのCSVリンク、stat-paginate-lastのページネーション）を再現し、
+合成したZIPファイルを配信する。遅延・帯域・エラー注入を設定でき、
+クローラーの速度をオフラインで計測・検証するために使う。
+
+    python estat_mock_server.py --port 8000 --latency 0.2 --bandwidth 2000000 --error-rate 0.05
+    ESTAT_BASE_URL=http://127.0.0.1:8000 python download_population_census_mesh.py
+"""
+
+import argparse
+import functools
+import html
+import io
+import random
+import threading
+import time
+import urllib.parse
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MESH_EXPANDER = "4次メッシュ（500mメッシュ）"
+
+# 結果一覧に表示する公開日（--republish で指定したメッシュは再公開日になる）
+PUBLISHED_DATE = "2023-06-30"
+REPUBLISHED_DATE = "2024-03-29"
+
+# toukeiCode -> 年ごとの統計表（リンクテキストと統計表ID）
+# リンクテキストはクローラーのXPathが探している文言に合わせる
+SURVEYS = {
+    # 経済センサス－活動調査
+    "00200553": {
+        "2021": {"title": "産業（大分類）別事業所数及び従業者数", "stats_id": "T000918", "anchor_class": ""},
+        "2016": {"title": "産業（大分類）別事業所数及び従業者数", "stats_id": "T000876", "anchor_class": ""},
+        "2012": {"title": "事業所数及び従業者数", "stats_id": "T000702", "anchor_class": ""},
+    },
+    # 国勢調査
+    "00200521": {
+        "2020": {"title": "人口及び世帯　（JGD2011）", "stats_id": "T001102", "anchor_class": "stat-title-anchor"},
+        "2015": {"title": "その１　人口等基本集計に関する事項", "stats_id": "T000847", "anchor_class": "stat-title-anchor"},
+    },
+}
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="ja">
+<head><meta charset="utf-8"><title>地図で見る統計(jSTAT MAP) | 統計地理情報システム</title></head>
+<body>
+{body}
+<script>
+function gotoPage(page) {{
+  var params = new URLSearchParams(window.location.search);
+  params.set("page", page);
+  window.location.search = params.toString();
+}}
+</script>
+</body>
+</html>
+"""
+
+
+def first_mesh_codes(count):
+    """1次メッシュコード（4桁）を決まった順に count 個生成"""
+    codes = [f"{lat}{lon}" for lat in range(30, 69) for lon in range(22, 49)]
+    return codes[:count]
+
+
+@functools.lru_cache(maxsize=1024)
+def build_zip(stats_id, code, rows, seed, revision=0):
+    """
+    統計表のZIPファイルを合成する。
+    中身はShift-JISのTXT（e-Statのメッシュ統計と同じ2行ヘッダー形式）1ファイル。
+    revision を変えると中身の数値が変わる（訂正版の再公開を再現する）。
+    """
+    rng = random.Random(f"{seed}-{stats_id}-{code}-{revision}")
+    lines = [
+        f"KEY_CODE,HTKSYORI,HTKSAKI,GASSAN,{stats_id}001,{stats_id}002,{stats_id}003",
+        ",,,,人口（総数）,人口（総数）　男,人口（総数）　女",
+    ]
+    for row in range(rows):
+        male = rng.randint(0, 5000)
+        female = rng.randint(0, 5000)
+        key_code = f"{code}{row % 100:02d}{row // 100 % 100:02d}{row % 4 + 1}"
+        lines.append(f"{key_code},0,,,{male + female},{male},{female}")
+    text = "\r\n".join(lines) + "\r\n"
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        zip_ref.writestr(f"tbl{stats_id}H{code}.txt", text.encode("shift_jis"))
+    return buffer.getvalue()
+
+
+class MockEStatHandler(BaseHTTPRequestHandler):
+    """statmap-searchのページとCSV（ZIP）ダウンロードを返すハンドラ"""
+
+    server_version = "MockEStat/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.options.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        parts = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(parts.query))
+        try:
+            if parts.path == "/gis/statmap-search":
+                time.sleep(self.server.options.page_latency)
+                if query.get("toukeiYear"):
+                    self.send_html(self.render_result_list(query))
+                else:
+                    self.send_html(self.render_search_top(query))
+            elif parts.path == "/gis/statmap-search/data":
+                self.send_download(query)
+            else:
+                self.send_error(404)
+        except KeyError as e:
+            self.send_error(404, f"Unknown parameter value: {e}")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def send_html(self, body):
+        payload = PAGE_TEMPLATE.format(body=body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def archive(self, stats_id, code):
+        """メッシュごとのZIPファイルと公開日を返す"""
+        options = self.server.options
+        revision = 1 if code in options.republish else 0
+        payload = build_zip(stats_id, code, options.rows, options.seed, revision)
+        return payload, REPUBLISHED_DATE if revision else PUBLISHED_DATE
+
+    def render_search_top(self, query):
+        """年のspan、メッシュの展開アイコン、各年の統計表リンクを並べたトップページ"""
+        toukei_code = query["toukeiCode"]
+        years = SURVEYS[toukei_code]
+        parts = ['<div class="stat-search_year">']
+        for year in years:
+            parts.append(f'<span class="js-year" tabindex="0">{year}年</span>')
+        parts.append("</div>")
+        parts.append(f'<span class="stat-icon_plus" data-value2="{MESH_EXPANDER}">＋</span>')
+        parts.append('<ul class="stat-title-list">')
+        for year, table in years.items():
+            href = "/gis/statmap-search?" + urllib.parse.urlencode(
+                {
+                    "page": 1,
+                    "type": 1,
+                    "toukeiCode": toukei_code,
+                    "toukeiYear": year,
+                    "aggregateUnit": "H",
+                    "serveyId": f"H{toukei_code}{year}",
+                    "statsId": table["stats_id"],
+                }
+            )
+            class_attr = f' class="{table["anchor_class"]}"' if table["anchor_class"] else ""
+            parts.append(f'<li><a{class_attr} href="{html.escape(href)}">{table["title"]}</a></li>')
+        parts.append("</ul>")
+        return "\n".join(parts)
+
+    def render_result_list(self, query):
+        """CSVリンクの一覧とページネーションを持つ結果一覧ページ"""
+        options = self.server.options
+        table = SURVEYS[query["toukeiCode"]][query["toukeiYear"]]
+        stats_id = table["stats_id"]
+        codes = first_mesh_codes(options.files)
+        total_pages = max(1, -(-len(codes) // options.per_page))
+        page = min(max(1, int(query.get("page", 1))), total_pages)
+
+        parts = ['<div class="stat-resorce_list-body">']
+        for code in codes[(page - 1) * options.per_page : page * options.per_page]:
+            csv_href = "/gis/statmap-search/data?" + urllib.parse.urlencode(
+                {"statsId": stats_id, "code": code, "downloadType": 2}
+            )
+            shape_href = "/gis/statmap-search/data?" + urllib.parse.urlencode(
+                {"statsId": stats_id, "code": code, "downloadType": 5}
+            )
+            payload, published = self.archive(stats_id, code)
+            parts.append(
+                '<article class="stat-resorce_list-item">'
+                '<ul class="stat-resorce_list-detail">'
+                f'<li class="stat-resorce_list-title">M{code}</li>'
+                f'<li class="stat-resorce_list-date">公開（更新）日　{published}</li>'
+                f'<li class="stat-resorce_list-size">{len(payload) / 1024:.1f}KB</li>'
+                "</ul>"
+                f'<a class="stat-dl_icon stat-icon_3 js-dl" href="{html.escape(csv_href)}"><span>CSV</span></a>'
+                f'<a class="stat-dl_icon stat-icon_4 js-dl" href="{html.escape(shape_href)}"><span>世界測地系緯度経度・Shape</span></a>'
+                "</article>"
+            )
+        parts.append("</div>")
+
+        parts.append('<div class="stat-paginate">')
+        for number in range(1, total_pages):
+            parts.append(
+                f'<span class="stat-paginate-item js-gisdownload-tabindex" data-page="{number}" '
+                f'onclick="gotoPage({number})">{number}</span>'
+            )
+        parts.append(
+            f'<span class="stat-paginate-last js-gisdownload-tabindex" data-page="{total_pages}" '
+            f'onclick="gotoPage({total_pages})">{total_pages}</span>'
+        )
+        parts.append("</div>")
+        return "\n".join(parts)
+
+    def send_download(self, query):
+        """遅延・帯域制限・エラー注入をかけてZIPファイルを返す"""
+        options = self.server.options
+        time.sleep(options.latency)
+        with self.server.rng_lock:
+            failed = self.server.rng.random() < options.error_rate
+        if failed:
+            self.send_error(503, "Injected error")
+            return
+
+        if query.get("downloadType") != "2":
+            self.send_error(404, "Only CSV downloads are served")
+            return
+        stats_id, code = query["statsId"], query["code"]
+        payload, _ = self.archive(stats_id, code)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Disposition", f'attachment; filename="tbl{stats_id}H{code}.zip"')
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+
+        # 帯域制限（bytes/秒）。0なら制限なし
+        chunk_size = 16 * 1024
+        for start in range(0, len(payload), chunk_size):
+            chunk = payload[start : start + chunk_size]
+            self.wfile.write(chunk)
+            if options.bandwidth:
+                time.sleep(len(chunk) / options.bandwidth)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="e-Stat statmap-searchのローカル用スタンドインサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--files", type=int, default=60, help="統計表ごとのCSVファイル数")
+    parser.add_argument("--per-page", type=int, default=20, help="1ページあたりのファイル数")
+    parser.add_argument("--rows", type=int, default=2000, help="TXT 1ファイルあたりの行数")
+    parser.add_argument("--latency", type=float, default=0.0, help="ダウンロード1件あたりの遅延（秒）")
+    parser.add_argument("--page-latency", type=float, default=0.0, help="ページ表示の遅延（秒）")
+    parser.add_argument("--bandwidth", type=float, default=0, help="1接続あたりの帯域（bytes/秒, 0で無制限）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="ダウンロードが503になる確率（0〜1）")
+    parser.add_argument("--seed", type=int, default=0, help="合成データとエラー注入の乱数シード")
+    parser.add_argument(
+        "--republish",
+        type=lambda text: set(filter(None, text.split(","))),
+        default=set(),
+        help="訂正版として再公開されたことにする1次メッシュコード（カンマ区切り, 例: 3022,3023）",
+    )
+    parser.add_argument("--verbose", action="store_true", help="アクセスログを表示")
+    return parser
+
+
+def start_server(options, host=None, port=None):
+    """サーバーをバックグラウンドスレッドで起動し、(server, base_url) を返す"""
+    server = ThreadingHTTPServer((host or options.host, options.port if port is None else port), MockEStatHandler)
+    server.daemon_threads = True
+    server.options = options
+    server.rng = random.Random(options.seed)
+    server.rng_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    bound_host, bound_port = server.server_address[:2]
+    return server, f"http://{bound_host}:{bound_port}"
+
+
+if __name__ == "__main__":
+    options = build_parser().parse_args()
+    server, base_url = start_server(options)
+    print(f"スタンドインサーバーを起動しました: {base_url}")
+    for toukei_code in SURVEYS:
+        print(f"  {base_url}/gis/statmap-search?page=1&type=1&toukeiCode={toukei_code}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,390 @@
+"""
+e-Statの再公開（訂正版）を検出し、新規・更新されたファイルだけを取得する差分同期。
+
+結果一覧ページのCSVの一覧（公開日・サイズが表示されていればそれも）と、
+前回までに取得したファイルの台帳（downloads/sync_ledger.json）を比較して、
+取得計画と変更レポートを作る。取得したZIPのうち中身が変わったものだけをCSVに再変換する。
+
+台帳はこのスクリプトだけが更新する。台帳が無い初回は全ファイルが新規になるため、
+ダウンロードスクリプトで取得済みの場合は --seed-from-local で台帳に登録してから同期する。
+
+    python estat_sync.py --dry-run                      # 変更レポートのみ
+    python estat_sync.py --seed-from-local              # 既存の downloads を台帳に登録してから同期
+    python estat_sync.py --target population_census_mesh --years 2020
+    python estat_sync.py --report sync_report.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import urllib.parse
+from datetime import datetime
+
+from adaptive_scheduler import AdaptiveScheduler, default_memory_budget, estimate_zip_memory
+from estat_listing import DEFAULT_BASE_URL, download_file, find_result_list_url, list_result_entries
+
+DEFAULT_LEDGER_PATH = os.path.join(".", "downloads", "sync_ledger.json")
+
+# 同期対象。保存先はダウンロードスクリプトと同じ {download_dir}/{年}/zip
+# years は 年 -> 統計表のリンクテキスト（ダウンロードスクリプトのXPathと同じ文言）
+TARGETS = {
+    "economic_census_activity": {
+        "toukei_code": "00200553",
+        "download_dir": os.path.join(".", "downloads"),
+        "years": {
+            "2021": "産業（大分類）別事業所数及び従業者数",
+            "2016": "産業（大分類）別事業所数及び従業者数",
+            "2012": "事業所数及び従業者数",
+        },
+    },
+    "population_census_mesh": {
+        "toukei_code": "00200521",
+        "download_dir": os.path.join(".", "downloads", "csv_500mメッシュ人口と世帯"),
+        "years": {
+            "2020": "人口及び世帯　（JGD2011）",
+            "2015": "その１　人口等基本集計に関する事項",
+        },
+    },
+}
+
+
+def load_ledger(ledger_path):
+    """台帳を読み込む。無ければ空の台帳を返す"""
+    if not os.path.exists(ledger_path):
+        return {"entries": {}}
+    with open(ledger_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_ledger(ledger, ledger_path):
+    """台帳を書き込む（途中で止まっても壊れないように一時ファイル経由で置き換える）"""
+    os.makedirs(os.path.dirname(ledger_path) or ".", exist_ok=True)
+    tmp_path = f"{ledger_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(ledger, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, ledger_path)
+
+
+def list_remote(base_url, target_names, years=None):
+    """
+    対象の統計表の結果一覧をすべて取得する。
+    一覧を取得できた (対象, 年) の組と、CSVの項目のリストを返す。
+    """
+    scanned = []
+    remote_entries = []
+    for target_name in target_names:
+        target = TARGETS[target_name]
+        for year, title in target["years"].items():
+            if years and year not in years:
+                continue
+            try:
+                result_url = find_result_list_url(base_url, target["toukei_code"], year, title)
+                entries = list_result_entries(result_url)
+            except Exception as e:
+                print(f"{target_name} {year}年の一覧を取得できませんでした: {e}")
+                continue
+            scanned.append((target_name, year))
+            for entry in entries:
+                entry.update({"target": target_name, "year": year})
+                remote_entries.append(entry)
+            print(f"{target_name} {year}年: {len(entries)} ファイル")
+    return scanned, remote_entries
+
+
+def ledger_key(url):
+    """台帳のキー。ホスト名を除いたパスとクエリ（接続先をスタンドインサーバーに変えても同じキーになる）"""
+    parts = urllib.parse.urlsplit(url)
+    return f"{parts.path}?{parts.query}"
+
+
+def diff_listing(remote_entries, ledger, scanned):
+    """
+    リモートの一覧と台帳を比較し、変更の種類ごとに項目を分けた辞書を返す。
+    - new: 台帳に無い
+    - updated: 公開日またはサイズが台帳と異なる（両方に値がある場合のみ比較）
+    - unchanged: 変化なし
+    - unknown: 台帳にはあるが、公開日・サイズが一覧に無いため更新を判断できない
+    - removed: 台帳にあるが、一覧から消えた
+    """
+    changes = {"new": [], "updated": [], "unchanged": [], "unknown": [], "removed": []}
+    held = ledger["entries"]
+    remote_keys = set()
+
+    for entry in remote_entries:
+        remote_keys.add(ledger_key(entry["url"]))
+        record = held.get(ledger_key(entry["url"]))
+        if record is None:
+            changes["new"].append(entry)
+            continue
+
+        comparable = False
+        changed = False
+        for field, ledger_field in [("published", "published"), ("size", "listed_size")]:
+            if entry[field] is not None and record.get(ledger_field) is not None:
+                comparable = True
+                changed = changed or entry[field] != record[ledger_field]
+        if changed:
+            changes["updated"].append(
+                dict(entry, previous={"published": record.get("published"), "size": record.get("listed_size")})
+            )
+        elif comparable:
+            changes["unchanged"].append(entry)
+        else:
+            changes["unknown"].append(entry)
+
+    scanned = set(scanned)
+    for key, record in held.items():
+        if (record["target"], record["year"]) in scanned and key not in remote_keys:
+            changes["removed"].append(dict(record, key=key))
+    return changes
+
+
+def seed_ledger(remote_entries, ledger):
+    """
+    ダウンロードスクリプトと kaitou.py で取得済みのファイルを台帳に登録する。
+    年のフォルダにCSVかZIPがある (対象, 年) について、一覧の項目を取得済みとして記録する。
+    手元のファイルのうち最も古い更新日より前に公開された項目は一覧の公開日で登録する。
+    それ以降に公開（訂正）された項目は手元の更新日を公開日として登録し、同期で「更新」として取得させる。
+    中身のハッシュは分からないため、以後に更新が見つかった場合は取得して変換する。
+    登録した件数を返す。
+    """
+    seeded = 0
+    local_dates = {}
+    for entry in remote_entries:
+        target_year = (entry["target"], entry["year"])
+        if target_year not in local_dates:
+            year_dir = os.path.join(TARGETS[entry["target"]]["download_dir"], entry["year"])
+            mtimes = []
+            for directory in [year_dir, os.path.join(year_dir, "zip")]:
+                if os.path.isdir(directory):
+                    mtimes.extend(
+                        os.path.getmtime(os.path.join(directory, f))
+                        for f in os.listdir(directory)
+                        if f.endswith((".csv", ".zip"))
+                    )
+            local_dates[target_year] = datetime.fromtimestamp(min(mtimes)).date().isoformat() if mtimes else None
+
+        local_date = local_dates[target_year]
+        key = ledger_key(entry["url"])
+        if local_date is None or key in ledger["entries"]:
+            continue
+        # 同じ日の公開は取得より後の可能性があるので、手元のファイルより古いとはみなさない
+        # （公開日が一覧に無い場合は比べられないので、一覧の内容で登録する）
+        held = entry["published"] is None or entry["published"] < local_date
+        ledger["entries"][key] = {
+            "target": entry["target"],
+            "year": entry["year"],
+            "title": entry["title"],
+            "published": entry["published"] if held else local_date,
+            "listed_size": entry["size"] if held else None,
+            "file_name": None,
+            "file_size": None,
+            "sha256": None,
+            "fetched_at": None,
+            "seeded_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        seeded += 1
+    return seeded
+
+
+def zip_dir_for(entry):
+    return os.path.join(TARGETS[entry["target"]]["download_dir"], entry["year"], "zip")
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fetch_entry(entry):
+    """1ファイルを年ごとのzipフォルダにダウンロードし、保存先のパスを返す"""
+    zip_dir = zip_dir_for(entry)
+    os.makedirs(zip_dir, exist_ok=True)
+    return download_file(entry["url"], zip_dir)
+
+
+def fetch_plan(plan, ledger):
+    """
+    取得計画のファイルをダウンロードする。
+    中身（SHA-256）が前回と同じものは台帳を更新してZIPを削除する。
+    中身が変わったものは (項目, ZIPのパス, 台帳に書く内容) のリストで返し、台帳への記録は
+    CSVへの変換が成功してから行う（変換に失敗したものは次回の同期で再取得される）。
+    失敗した項目のリストも返す。
+    """
+    scheduler = AdaptiveScheduler(max_workers=2 * (os.cpu_count() or 1))
+    changed = []
+    failed = []
+    tasks = [(index, (entry,), 0) for index, entry in enumerate(plan)]
+    for index, future in scheduler.run(fetch_entry, tasks):
+        entry = plan[index]
+        try:
+            zip_path = future.result()
+        except Exception as e:
+            print(f"{entry['title'] or entry['url']} のダウンロードに失敗しました: {e}")
+            failed.append(dict(entry, error=str(e)))
+            continue
+
+        sha256 = file_sha256(zip_path)
+        key = ledger_key(entry["url"])
+        record = {
+            "target": entry["target"],
+            "year": entry["year"],
+            "title": entry["title"],
+            "published": entry["published"],
+            "listed_size": entry["size"],
+            "file_name": os.path.basename(zip_path),
+            "file_size": os.path.getsize(zip_path),
+            "sha256": sha256,
+            "fetched_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        if ledger["entries"].get(key, {}).get("sha256") != sha256:
+            changed.append((entry, zip_path, record))
+        else:
+            # 公開日だけが変わって中身は同じ場合は再変換しない
+            os.remove(zip_path)
+            ledger["entries"][key] = record
+    return changed, failed
+
+
+def reconvert(changed_zips, memory_limit=None):
+    """中身が変わったZIPだけを解凍してCSVに変換し、変換済みのZIPと展開用フォルダを削除する"""
+    # pandasが必要なので、変換するときだけ読み込む
+    from kaitou import clean_up_directories, create_directory_if_not_exists, process_zip_to_csv
+
+    if memory_limit is None:
+        memory_limit = default_memory_budget()
+    scheduler = AdaptiveScheduler(memory_limit=memory_limit)
+
+    tasks = []
+    for entry, zip_path in changed_zips:
+        year_dir = os.path.dirname(os.path.dirname(zip_path))
+        origin_dir = os.path.join(year_dir, "txt_origin")
+        create_directory_if_not_exists(origin_dir)
+        tasks.append((zip_path, (zip_path, origin_dir, year_dir), estimate_zip_memory(zip_path)))
+
+    converted = []
+    for zip_path, future in scheduler.run(process_zip_to_csv, tasks):
+        try:
+            future.result()
+            converted.append(zip_path)
+            os.remove(zip_path)
+        except Exception as exc:
+            print(f"{os.path.basename(zip_path)} の処理中に例外が発生しました: {exc}")
+
+    for year_dir in {os.path.dirname(os.path.dirname(zip_path)) for _, zip_path in changed_zips}:
+        clean_up_directories([os.path.join(year_dir, "txt_origin")])
+        zip_dir = os.path.join(year_dir, "zip")
+        if os.path.isdir(zip_dir) and not os.listdir(zip_dir):
+            shutil.rmtree(zip_dir)
+    return converted
+
+
+def print_report(changes):
+    print("---------------- 変更レポート ----------------")
+    print(
+        f"新規: {len(changes['new'])}  更新: {len(changes['updated'])}  変更なし: {len(changes['unchanged'])}  "
+        f"判定不可: {len(changes['unknown'])}  削除: {len(changes['removed'])}"
+    )
+    for entry in changes["updated"]:
+        previous = entry["previous"]
+        print(
+            f"  更新 {entry['target']} {entry['year']}年 {entry['title']}: "
+            f"公開日 {previous['published']} -> {entry['published']}, サイズ {previous['size']} -> {entry['size']}"
+        )
+    for entry in changes["removed"]:
+        print(f"  削除 {entry['target']} {entry['year']}年 {entry['title']}（ローカルのCSVは残します）")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="e-Statの新規・更新ファイルだけを取得してCSVに変換")
+    parser.add_argument("--target", choices=sorted(TARGETS), action="append", help="同期対象（省略時はすべて）")
+    parser.add_argument("--years", help="対象の年（カンマ区切り, 例: 2020,2015）")
+    parser.add_argument("--ledger", default=DEFAULT_LEDGER_PATH, help="取得済みファイルの台帳")
+    parser.add_argument("--report", help="変更レポートをJSONで保存するパス")
+    parser.add_argument("--dry-run", action="store_true", help="変更レポートと取得計画の表示のみ")
+    parser.add_argument(
+        "--no-convert",
+        action="store_true",
+        help="ダウンロードのみ行い、CSV変換はしない（中身が変わったZIPは台帳に記録しないので、次回の同期で再取得して変換する）",
+    )
+    parser.add_argument(
+        "--seed-from-local",
+        action="store_true",
+        help="downloads 以下に既にある年のファイルを、現在の一覧の内容で取得済みとして台帳に登録する",
+    )
+    parser.add_argument(
+        "--include-unknown",
+        action="store_true",
+        help="公開日・サイズが一覧に無く更新を判断できないファイルも取得する",
+    )
+    args = parser.parse_args()
+
+    base_url = os.environ.get("ESTAT_BASE_URL", DEFAULT_BASE_URL).rstrip("/")
+    target_names = args.target or list(TARGETS)
+    years = set(args.years.split(",")) if args.years else None
+
+    ledger = load_ledger(args.ledger)
+    scanned, remote_entries = list_remote(base_url, target_names, years)
+    if args.seed_from_local:
+        seeded = seed_ledger(remote_entries, ledger)
+        print(f"取得済みとして台帳に登録: {seeded} ファイル")
+        if not args.dry_run:
+            save_ledger(ledger, args.ledger)
+    changes = diff_listing(remote_entries, ledger, scanned)
+    print_report(changes)
+
+    plan = changes["new"] + changes["updated"] + (changes["unknown"] if args.include_unknown else [])
+    print(f"取得計画: {len(plan)} ファイル")
+
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "base_url": base_url,
+        "changes": changes,
+        "plan": [entry["url"] for entry in plan],
+        "fetched": [],
+        "changed": [],
+        "converted": [],
+        "failed": [],
+    }
+
+    if not args.dry_run and changes["removed"]:
+        # 一覧から消えたファイルは一度だけ報告し、台帳から外す（ローカルのCSVは残す）
+        for record in changes["removed"]:
+            ledger["entries"].pop(record["key"], None)
+        save_ledger(ledger, args.ledger)
+
+    if not args.dry_run and plan:
+        try:
+            changed, report["failed"] = fetch_plan(plan, ledger)
+        finally:
+            save_ledger(ledger, args.ledger)
+        failed_urls = {entry["url"] for entry in report["failed"]}
+        report["fetched"] = [entry["url"] for entry in plan if entry["url"] not in failed_urls]
+        report["changed"] = [entry["url"] for entry, _, _ in changed]
+        print(f"取得: {len(report['fetched'])} ファイル（中身が変わったもの {len(changed)} ファイル）")
+
+        if args.no_convert:
+            # CSVが古いままなので台帳には記録しない（kaitou.py は経済センサスのZIPを変換しない）
+            done = set()
+        elif changed:
+            report["converted"] = reconvert([(entry, zip_path) for entry, zip_path, _ in changed])
+            done = set(report["converted"])
+            print(f"CSVに変換: {len(report['converted'])} ファイル")
+        else:
+            done = set()
+
+        # 変換まで終わったものだけ台帳に記録する
+        for entry, zip_path, record in changed:
+            if zip_path in done:
+                ledger["entries"][ledger_key(entry["url"])] = record
+        save_ledger(ledger, args.ledger)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"変更レポートを保存しました: {args.report}")
@@ -0,0 +1,216 @@
+"""
+解析用のCSV読み込みキャッシュ。
+
+    from frame_cache import read_csv_cached
+    df0 = read_csv_cached(csv_file_list[0])
+
+2段構成で、読み込んだDataFrameを再利用する。
+1. プロセス内のLRUキャッシュ（DataFrameのメモリ使用量の合計で上限を設定）
+2. ディスク上のFeatherファイル（元CSVのパス・更新時刻・サイズごとに保存し、合計サイズで上限を設定）
+
+元CSVが更新されると更新時刻・サイズが変わるため、古いキャッシュは使われずに読み直される。
+Featherの読み書きにはpyarrowが必要で、無い場合はメモリ上のキャッシュのみを使う。
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.path.join(os.getcwd(), ".frame_cache")
+DEFAULT_MAX_MEMORY_BYTES = 1024**3  # 1GB
+DEFAULT_MAX_DISK_BYTES = 10 * 1024**3  # 10GB
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+def _hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _option_value(value):
+    """
+    json.dumps で直接書けない読み込みオプションの値を、プロセスをまたいで同じになる表記に変換する。
+    関数（usecols=lambda ... や converters）などは表記が実行ごとに変わるので TypeError にする。
+    """
+    if isinstance(value, type):
+        return f"{value.__module__}.{value.__qualname__}"
+    if isinstance(value, (np.dtype, pd.api.extensions.ExtensionDtype)):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    raise TypeError(f"キャッシュのキーにできない値です: {value!r}")
+
+
+class FrameCache:
+    """CSVを読み込んだDataFrameを、メモリ（LRU）とディスク（Feather）にキャッシュする"""
+
+    def __init__(
+        self,
+        cache_dir=DEFAULT_CACHE_DIR,
+        max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES,
+        max_disk_bytes=DEFAULT_MAX_DISK_BYTES,
+    ):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        # pyarrowが無い場合、またはmax_disk_bytesが0ならディスクキャッシュは使わない
+        self.max_disk_bytes = max_disk_bytes if HAS_PYARROW else 0
+        # (パス, 読み込みオプション) -> (元ファイルの(mtime, size), DataFrame, メモリ使用量)
+        self._frames = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def read_csv(self, file_path, copy=True, **read_csv_kwargs):
+        """
+        ローカルのCSVファイルを pd.read_csv で読み込み、キャッシュにあればそれを返す。
+        URLやバッファなどファイルパス以外、chunksize・iterator を指定した場合（DataFrameではなく
+        TextFileReaderが返る）、関数など実行ごとに表記が変わる値をオプションに含む場合は、
+        キャッシュせずに pd.read_csv に渡す。
+        copy=True の場合はコピーを返すので、返り値を変更してもキャッシュには影響しない。
+        """
+        if (
+            not isinstance(file_path, (str, os.PathLike))
+            or not os.path.isfile(file_path)
+            or read_csv_kwargs.get("chunksize") is not None
+            or read_csv_kwargs.get("iterator")
+        ):
+            return pd.read_csv(file_path, **read_csv_kwargs)
+
+        try:
+            options = json.dumps(read_csv_kwargs, sort_keys=True, default=_option_value)
+        except (TypeError, ValueError):
+            return pd.read_csv(file_path, **read_csv_kwargs)
+
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        key = (file_path, options)
+
+        # 1段目: メモリ
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is not None and entry[0] == signature:
+                self._frames.move_to_end(key)
+                return entry[1].copy() if copy else entry[1]
+
+        # 2段目: ディスク
+        df = self._load_from_disk(file_path, options, signature)
+        if df is None:
+            df = pd.read_csv(file_path, **read_csv_kwargs)
+            if not isinstance(df, pd.DataFrame):
+                return df
+            self._save_to_disk(df, file_path, options, signature)
+
+        self._remember(key, signature, df)
+        return df.copy() if copy else df
+
+    def clear(self, disk=False):
+        """メモリ上のキャッシュを破棄する。disk=True ならディスク上のキャッシュも削除する"""
+        with self._lock:
+            self._frames.clear()
+            self._memory_bytes = 0
+        if disk and os.path.isdir(self.cache_dir):
+            for file_name in os.listdir(self.cache_dir):
+                if file_name.endswith(".feather"):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, file_name))
+                    except FileNotFoundError:
+                        pass
+
+    def _remember(self, key, signature, df):
+        """メモリ上のLRUに追加し、上限を超えた分を古い順に捨てる"""
+        nbytes = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            old = self._frames.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= old[2]
+            if nbytes > self.max_memory_bytes:
+                return  # 上限より大きいDataFrameはメモリには置かない
+            self._frames[key] = (signature, df, nbytes)
+            self._memory_bytes += nbytes
+            while self._memory_bytes > self.max_memory_bytes:
+                _, (_, _, evicted_bytes) = self._frames.popitem(last=False)
+                self._memory_bytes -= evicted_bytes
+
+    def _disk_path(self, file_path, options, signature):
+        # 先頭は (パス, オプション) ごとに共通にして、元ファイル更新時に古いものを消せるようにする
+        prefix = _hash(f"{file_path}\n{options}")
+        return os.path.join(self.cache_dir, f"{prefix}-{_hash(repr(signature))}.feather")
+
+    def _load_from_disk(self, file_path, options, signature):
+        if not self.max_disk_bytes:
+            return None
+        cache_path = self._disk_path(file_path, options, signature)
+        try:
+            df = pd.read_feather(cache_path)
+        except Exception:
+            # キャッシュが無い・壊れている場合はCSVから読み直す
+            return None
+        # 更新時刻をLRUの順序として使う（読み込み直後に他のプロセスが削除していても読めた結果は使う）
+        try:
+            os.utime(cache_path)
+        except OSError:
+            pass
+        return df
+
+    def _save_to_disk(self, df, file_path, options, signature):
+        if not self.max_disk_bytes:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_path = self._disk_path(file_path, options, signature)
+        prefix = os.path.basename(cache_path).split("-")[0]
+
+        # 同じCSVの古いキャッシュ（更新前のもの）を削除（他のプロセスが先に削除している場合もある）
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.startswith(f"{prefix}-") and file_name.endswith(".feather"):
+                try:
+                    os.remove(os.path.join(self.cache_dir, file_name))
+                except FileNotFoundError:
+                    pass
+
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            df.to_feather(tmp_path)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            # index_col 指定や数値の列名などFeatherで保存できない場合はメモリのみ
+            print(f"ディスクキャッシュに保存できませんでした ({os.path.basename(file_path)}): {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """ディスク上のキャッシュの合計サイズが上限を超えたら、使われていない順に削除"""
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith(".feather"):
+                cache_path = os.path.join(self.cache_dir, file_name)
+                try:
+                    stat = os.stat(cache_path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, cache_path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, cache_path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(cache_path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+default_cache = FrameCache()
+
+
+def read_csv_cached(file_path, **read_csv_kwargs):
+    """既定のキャッシュ（./.frame_cache）を使ってCSVを読み込む"""
+    return default_cache.read_csv(file_path, **read_csv_kwargs)
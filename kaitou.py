@@ -1,12 +1,13 @@
-import multiprocessing
+import argparse
 import os
 import shutil
 import zipfile
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import pandas as pd
 from tqdm import tqdm
 
+from adaptive_scheduler import AdaptiveScheduler, default_memory_budget, estimate_zip_memory, parse_memory_size
+
 # TODO: donwloads以下すべてのzipフォルダを探して，それより上の階層に出力するようにコード改良してもいい
 # ダウンロード先のフォルダパス
 download_dir = os.path.join(os.getcwd(), "downloads", "csv_500mメッシュ人口と世帯")
@@ -29,25 +30,26 @@ def convert_txt_to_csv(file_path, save_path):
 
 def unzip_file(zip_file_path, origin_dir):
     """
-    Unzips a single ZIP file into the origin_dir.
+    Unzips a single ZIP file into the origin_dir and returns the extracted member names.
     """
     with zipfile.ZipFile(zip_file_path, "r") as zip_ref:
         zip_ref.extractall(origin_dir)
+        return zip_ref.namelist()
 
 
 def process_zip_to_csv(zip_file_path, origin_dir, year_dir):
     """
-    Extracts a ZIP file and converts all TXT files to CSV within the year's folder.
+    Extracts a ZIP file and converts its TXT files to CSV within the year's folder.
     """
     # Unzip the file
-    unzip_file(zip_file_path, origin_dir)
+    extracted_files = unzip_file(zip_file_path, origin_dir)
 
-    # Convert TXT files to CSV
-    for txt_file in os.listdir(origin_dir):
+    # Convert only the TXT files from this ZIP (origin_dir is shared by parallel tasks)
+    for txt_file in extracted_files:
         if txt_file.endswith(".txt"):
             txt_file_path = os.path.join(origin_dir, txt_file)
             # Save CSV in the corresponding year's directory (one level above)
-            csv_file_path = os.path.join(year_dir, f"{os.path.splitext(txt_file)[0]}.csv")
+            csv_file_path = os.path.join(year_dir, f"{os.path.splitext(os.path.basename(txt_file))[0]}.csv")
             convert_txt_to_csv(txt_file_path, csv_file_path)
 
 
@@ -59,10 +61,16 @@ def clean_up_directories(dirs_to_remove):
             print(f"削除しました: {directory}")
 
 
-def unzip_and_convert_to_csv_parallel(download_dir):
+def unzip_and_convert_to_csv_parallel(download_dir, memory_limit=None, max_workers=None):
     """
     Unzips all ZIP files in parallel and converts extracted TXT files to CSV, organizing by year.
+    Tasks are scheduled largest-first within the memory budget (estimated from the
+    uncompressed TXT sizes), and concurrency is tuned from the observed throughput.
     """
+    if memory_limit is None:
+        memory_limit = default_memory_budget()
+    scheduler = AdaptiveScheduler(max_workers=max_workers, memory_limit=memory_limit)
+
     # Loop through all directories in the downloads folder
     for year in os.listdir(download_dir):
         year_dir = os.path.join(download_dir, year)
@@ -77,33 +85,39 @@ def unzip_and_convert_to_csv_parallel(download_dir):
 
             zip_files = [os.path.join(zip_dir, f) for f in os.listdir(zip_dir) if f.endswith(".zip")]
 
-            # Dynamically set the number of workers based on CPU cores
-            num_cores = multiprocessing.cpu_count()
-            max_workers = max(1, num_cores // 2)
+            # (key, args, 見積もりメモリ) のタスクを作成
+            tasks = [
+                (zip_file, (zip_file, origin_dir, year_dir), estimate_zip_memory(zip_file)) for zip_file in zip_files
+            ]
 
-            print(f"並列化に使用するCPU数: {max_workers} / {num_cores} cores")
+            print(f"並列化の設定: {scheduler.describe()}")
 
-            # Using ThreadPoolExecutor to process files in parallel
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = {
-                    executor.submit(process_zip_to_csv, zip_file, origin_dir, year_dir): zip_file
-                    for zip_file in zip_files
-                }
-
-                for future in tqdm(
-                    as_completed(futures), total=len(futures), desc=f"{year}年のZIPファイルの解凍とCSV変換", unit="file"
-                ):
-                    zip_file_path = futures[future]
-                    try:
-                        future.result()
-                    except Exception as exc:
-                        print(f"{os.path.basename(zip_file_path)} の処理中に例外が発生しました: {exc}")
+            for zip_file_path, future in tqdm(
+                scheduler.run(process_zip_to_csv, tasks),
+                total=len(tasks),
+                desc=f"{year}年のZIPファイルの解凍とCSV変換",
+                unit="file",
+            ):
+                try:
+                    future.result()
+                except Exception as exc:
+                    print(f"{os.path.basename(zip_file_path)} の処理中に例外が発生しました: {exc}")
 
             # Clean up the origin and zip directories after processing
             clean_up_directories([origin_dir, zip_dir])
 
 
-# ステップ1: ZIPファイルを解凍してtxt_originに保存 (並列処理)
-unzip_and_convert_to_csv_parallel(download_dir)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ZIPファイルを解凍してCSVに変換")
+    parser.add_argument(
+        "--memory-limit",
+        type=parse_memory_size,
+        help="同時に変換するファイルの見積もりメモリの上限（例: 2G, 512M）。省略時は利用可能メモリから自動設定",
+    )
+    parser.add_argument("--max-workers", type=int, help="並列数の上限（省略時はCPUコア数）")
+    args = parser.parse_args()
+
+    # ステップ1: ZIPファイルを解凍してtxt_originに保存 (並列処理)
+    unzip_and_convert_to_csv_parallel(download_dir, memory_limit=args.memory_limit, max_workers=args.max_workers)
 
-print("処理が完了し、csvディレクトリのみが残りました。")
+    print("処理が完了し、csvディレクトリのみが残りました。")
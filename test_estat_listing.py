@@ -0,0 +1,25 @@
+from estat_listing import parse_result_entries
+
+BASE_URL = "http://127.0.0.1:8000/gis/statmap-search/data?page=1"
+
+
+def test_parse_result_entries_without_item_class():
+    # stat-resorce_list-item のクラスが無いマークアップでも、項目ごとに公開日・タイトルを取り出す
+    html = """
+    <div class="stat-resorce_list-body">
+      <div><ul>
+        <li>M3022</li><li>公開（更新）日　2023-06-30</li><li>12.5KB</li>
+      </ul><a class="stat-dl_icon" href="/a"><span>CSV</span></a></div>
+      <div><ul>
+        <li>M3023</li><li>公開（更新）日　2024-03-29</li><li>1.0MB</li>
+      </ul><a class="stat-dl_icon" href="/b"><span>CSV</span></a></div>
+    </div>
+    <span class="stat-paginate-last js-gisdownload-tabindex" data-page="3">最後</span>
+    """
+    entries, total_pages = parse_result_entries(html, BASE_URL)
+
+    assert total_pages == 3
+    assert [(e["url"], e["title"], e["published"], e["size"]) for e in entries] == [
+        ("http://127.0.0.1:8000/a", "M3022", "2023-06-30", int(12.5 * 1024)),
+        ("http://127.0.0.1:8000/b", "M3023", "2024-03-29", 1024**2),
+    ]